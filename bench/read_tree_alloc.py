@@ -0,0 +1,105 @@
+"""
+compares allocations of the slicing and memoryview tree parsers
+
+builds a 100k-entry tree object in memory and reports, for the old parser
+(which copied the body out of the inflated object and sliced every entry)
+and for comp.read_tree, the best wall time of REPEAT runs and the
+tracemalloc peak on top of the returned entries.
+
+run from the repository root: python bench/read_tree_alloc.py
+"""
+
+import gc
+import hashlib
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.comp import read_tree
+
+NUM_ENTRIES = 100000
+REPEAT = 10
+
+def build_tree(num_entries):
+    """
+    build inflated tree object (header and body) with num_entries blobs
+    """
+
+    body = b''.join(
+        b'100644 file%06d.txt\x00' % n + hashlib.sha1(b'%d' % n).digest()
+        for n in range(num_entries)
+    )
+    return b'tree %d\x00' % len(body) + body
+
+def read_tree_slicing(full_data):
+    """
+    parse tree the way read_object and read_tree did before memoryviews
+    """
+
+    data = full_data[full_data.index(b'\x00')+1:]
+    entries = []
+    i = 0
+    while True:
+        end = data.find(b'\x00', i)
+        if end == -1:
+            break
+        mode_str, path = data[i:end].decode().split()
+        entries.append((int(mode_str, 8), path, data[end+1:end+21].hex()))
+        i = end+21
+    return entries
+
+def read_tree_memoryview(full_data):
+    """
+    parse tree the way read_object(view=True) and read_tree do now
+    """
+
+    return read_tree(data=memoryview(full_data)[full_data.index(b'\x00')+1:])
+
+PARSERS = [('slicing', read_tree_slicing), ('memoryview', read_tree_memoryview)]
+
+def time_parsers(full_data):
+    """
+    return parser name -> best wall time of REPEAT rounds
+
+    parsers take turns within each round, after one untimed warm-up round,
+    and the collector is off, as in timeit, so neither one pays for the
+    other's garbage or warm-up
+    """
+
+    seconds = {name: float('inf') for name, _ in PARSERS}
+    for _, parser in PARSERS:
+        parser(full_data)
+    gc.disable()
+    for _ in range(REPEAT):
+        for name, parser in PARSERS:
+            start = time.perf_counter()
+            parser(full_data)
+            seconds[name] = min(seconds[name], time.perf_counter() - start)
+    gc.enable()
+    return seconds
+
+def measure_peak(parser, full_data):
+    """
+    return entries and tracemalloc peak over the returned entries
+    """
+
+    tracemalloc.start()
+    entries = parser(full_data)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (entries, peak - current)
+
+if __name__ == '__main__':
+    full_data = build_tree(NUM_ENTRIES)
+    seconds = time_parsers(full_data)
+    results = {}
+    for name, parser in PARSERS:
+        entries, transient = measure_peak(parser, full_data)
+        results[name] = entries
+        print('{:10} {} entries, transient peak {:.1f} MiB, best of {} {:.3f}s'.format(
+            name, len(entries), transient / 2**20, REPEAT, seconds[name]
+        ))
+    assert results['slicing'] == results['memoryview'], 'parsers disagree'
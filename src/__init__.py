@@ -11,7 +11,7 @@ def read_file(filename):
     :param filename: path of the file
     :type filename: String
     """
-    fh = open(filename, "r")
+    fh = open(filename, "rb")
     try:
         return fh.read()
     except FileNotFoundError as err:
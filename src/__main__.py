@@ -2,14 +2,20 @@
 contains the driver for command line arguments handling and driving methods
 """
 
+import os
 import sys
 import argparse
 
-from .indexing import add, diff, hash_object, ls_files, get_status
+from .indexing import add, diff, hash_object, ls_files, status
 from .objects import cat_file, read_file
+from .checkout import checkout
 from .commit import commit
+from .fast_import import fast_import
+from .fsck import fsck
+from .comp import diff_tree
 from .init import init
 from .push import push
+from .repack import repack
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -24,17 +30,33 @@ if __name__ == "__main__":
     sub_parser.add_argument('mode', choices=valid_modes, help='object type (commit, tree, blob) or display mode (size, type, pretty)')
     sub_parser.add_argument('hash_prefix', help='SHA-1 hash (or hash prefix) of object to display')
 
+    sub_parser = sub_parsers.add_parser('checkout', help="populate working copy and index from given commit")
+    sub_parser.add_argument('commit', help='SHA-1 hash (or hash prefix) of commit to check out')
+    sub_parser.add_argument('-t', '--threads', type=int, default=os.cpu_count() or 1, help="number of threads to write files with (default %(default)r)")
+    sub_parser.add_argument('-f', '--force', action='store_true', help="overwrite local changes and untracked files in the way")
+
     sub_parser = sub_parsers.add_parser('commit', help="commit current state of index to master branch")
     sub_parser.add_argument('-a', '--author', help="commit author in format 'A U Thor <author@example.com>' (uses GIT_AUTHOR_NAME and GIT_USER_NAME environment variables by default)")
     sub_parser.add_argument('-m', '--message', help="message for the commit")
 
     sub_parser = sub_parsers.add_parser('diff', help="show diff of files changed (between index and working copy")
 
+    sub_parser = sub_parsers.add_parser('diff-tree', help="show files changed between the trees of two commits")
+    sub_parser.add_argument('old_commit', help='SHA-1 hash (or hash prefix) of old commit')
+    sub_parser.add_argument('new_commit', help='SHA-1 hash (or hash prefix) of new commit')
+    sub_parser.add_argument('--name-status', action='store_true', help="show only status (A, D, M) and path of changed files")
+    sub_parser.add_argument('-p', '--patch', action='store_true', help="show content diff of changed files")
+
+    sub_parser = sub_parsers.add_parser('fsck', help="verify objects, references and index of the repo")
+    sub_parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help="number of processes to verify objects with (default %(default)r)")
+
     sub_parser = sub_parsers.add_parser('hash-object', help="hash contents of given path (and optionally write to object store)")
     sub_parser.add_argument('path', help='path of file to hash')
     sub_parser.add_argument('-t', choices=['commit', 'tree', 'blob'], default='blob', dest="type", help="type of object (default %(default)r)")
     sub_parser.add_argument('-w', action='store_true', dest="write", help='write object to object storage')
 
+    sub_parser = sub_parsers.add_parser('import', help="import stream of commits (fast-import format) from stdin into a new pack")
+
     sub_parser = sub_parsers.add_parser('init', help="initialize a new repo")
     sub_parser.add_argument('repo', help="directory name for new repo")
 
@@ -45,6 +67,11 @@ if __name__ == "__main__":
     sub_parser.add_argument('git_url', help="URL of git repo")
     sub_parser.add_argument('-p', '--password', help="password to use for authentication, default is GIT_PASSWORD env variable")
     sub_parser.add_argument('-u', '--username', help="username to use for authentication, default is GIT_USERNAME env variable")
+    sub_parser.add_argument('-t', '--threads', type=int, default=os.cpu_count() or 1, help="number of threads to encode the pack with (default %(default)r)")
+
+    sub_parser = sub_parsers.add_parser('repack', help="pack all objects reachable from branch heads into a new pack")
+    sub_parser.add_argument('-b', '--write-bitmap-index', action='store_true', dest='write_bitmap', help="write reachability bitmaps used by push to count objects")
+    sub_parser.add_argument('-d', action='store_true', dest='delete', help="remove old packs and loose objects that are now packed (unreachable objects in old packs are lost)")
 
     sub_parser = sub_parsers.add_parser('status', help="show status of working copy")
 
@@ -56,20 +83,45 @@ if __name__ == "__main__":
             cat_file(args.mode, args.hash_prefix)
         except ValueError as error:
             print(error, file=sys.stderr)
+    elif args.command == 'checkout':
+        try:
+            checkout(args.commit, args.threads, args.force)
+        except ValueError as error:
+            print(error, file=sys.stderr)
     elif args.command == 'commit':
         commit(args.message, args.author)
     elif args.command == 'diff':
         diff()
+    elif args.command == 'diff-tree':
+        try:
+            diff_tree(args.old_commit, args.new_commit, args.name_status, args.patch)
+        except ValueError as error:
+            print(error, file=sys.stderr)
+    elif args.command == "fsck":
+        try:
+            problems = fsck(args.jobs)
+        except ValueError as error:
+            print(error, file=sys.stderr)
+            sys.exit(2)
+        if problems:
+            sys.exit(1)
     elif args.command == "hash-object":
         sha1 = hash_object(read_file(args.path), args.type, write=args.write)
         print(sha1)
+    elif args.command == "import":
+        try:
+            fast_import(sys.stdin.buffer)
+        except ValueError as error:
+            print(error, file=sys.stderr)
     elif args.command == "init":
         init(args.repo)
     elif args.command == "ls-files":
         ls_files(args.stage)
     elif args.command == "push":
-        push(args.git_url, args.username, args.password)
+        push(args.git_url, args.username, args.password, args.threads)
+    elif args.command == "repack":
+        repack(args.write_bitmap, args.delete)
     elif args.command == "status":
-        get_status()
+        status()
     else:
         assert False, 'unexpected command {!r}'.format(args.command)
\ No newline at end of file
@@ -0,0 +1,230 @@
+"""
+reads and writes reachability bitmaps (.bitmap) of pack files
+
+a bitmap has one bit per object of the pack, in pack order, set for every
+object reachable from a commit. Bitmaps are stored run-length compressed
+with EWAH-style 64-bit words: a marker word (bit 0: run bit, bits 1-32: run
+length in words, bits 33-63: number of literal words) followed by the
+literal words.
+"""
+
+import array
+import bisect
+import collections
+import functools
+import hashlib
+import os
+import struct
+import sys
+
+from . import read_file, write_file
+from .pack import list_packs, read_pack_index
+
+BITMAP_SIGNATURE = b'BITM'
+WORD_MASK = (1 << 64) - 1
+MAX_RUN = (1 << 32) - 1
+MAX_LITERALS = (1 << 31) - 1
+
+# Bitmap index of a pack: digests are sorted as in the .idx, positions maps
+# an .idx index to a pack position, indexes maps a pack position back to an
+# .idx index and commits maps a commit SHA-1 to its bitmap (bytes)
+BitmapIndex = collections.namedtuple('BitmapIndex', [
+    'pack_path', 'digests', 'positions', 'indexes', 'commits'
+])
+
+def ewah_encode(bitmap):
+    """
+    compress a bitmap
+
+    :param bitmap: bitmap, bit i of byte i//8 for object i
+    :type bitmap: bytes-like object
+    :return: EWAH-style words
+    :rtype: list of int
+    """
+
+    padded = bytes(bitmap) + b'\x00' * (-len(bitmap) % 8)
+    words = struct.unpack('<{}Q'.format(len(padded) // 8), padded)
+    encoded = []
+    i = 0
+    while i < len(words):
+        run_bit = 1 if words[i] == WORD_MASK else 0
+        run_word = WORD_MASK if run_bit else 0
+        run = 0
+        while i < len(words) and words[i] == run_word and run < MAX_RUN:
+            run += 1
+            i += 1
+        start = i
+        while (i < len(words) and words[i] not in (0, WORD_MASK)
+                and i - start < MAX_LITERALS):
+            i += 1
+        encoded.append(run_bit | (run << 1) | ((i - start) << 33))
+        encoded.extend(words[start:i])
+    return encoded
+
+def ewah_decode(words, size):
+    """
+    decompress a bitmap
+
+    :param words: EWAH-style words
+    :type words: sequence of int
+    :param size: size of the bitmap in bytes
+    :type size: int
+    :return: bitmap
+    :rtype: bytes
+    """
+
+    chunks = []
+    i = 0
+    while i < len(words):
+        marker = words[i]
+        run = (marker >> 1) & MAX_RUN
+        literals = marker >> 33
+        chunks.append((b'\xff' if marker & 1 else b'\x00') * (run * 8))
+        chunks.append(struct.pack('<{}Q'.format(literals), *words[i+1:i+1+literals]))
+        i += 1 + literals
+    bitmap = b''.join(chunks)[:size]
+    return bitmap + b'\x00' * (size - len(bitmap))
+
+def bitmap_size(index):
+    """
+    get size in bytes of the bitmaps of an index
+
+    :param index: bitmap index
+    :type index: BitmapIndex
+    :return: size in bytes
+    :rtype: int
+    """
+
+    return (len(index.digests) + 7) // 8
+
+def object_position(index, sha1):
+    """
+    get pack position of an object
+
+    :param index: bitmap index
+    :type index: BitmapIndex
+    :param sha1: SHA-1 hash of the object
+    :type sha1: hex string
+    :return: position, None if the object is not in the pack
+    :rtype: int
+    """
+
+    digest = bytes.fromhex(sha1)
+    i = bisect.bisect_left(index.digests, digest)
+    if i < len(index.digests) and index.digests[i] == digest:
+        return index.positions[i]
+    return None
+
+def bitmap_objects(index, bitmap):
+    """
+    get objects set in a bitmap
+
+    :param index: bitmap index
+    :type index: BitmapIndex
+    :param bitmap: bitmap
+    :type bitmap: int or bytes-like object
+    :return: SHA-1 hashes of the objects
+    :rtype: set
+    """
+
+    if not isinstance(bitmap, int):
+        bitmap = int.from_bytes(bitmap, 'little')
+    bits = bin(bitmap)[:1:-1]
+    objects = set()
+    position = bits.find('1')
+    while position != -1:
+        objects.add(index.digests[index.indexes[position]].hex())
+        position = bits.find('1', position + 1)
+    return objects
+
+def pack_order(pack_path):
+    """
+    build pack position tables of a pack
+
+    :param pack_path: path of the pack file
+    :type pack_path: string
+    :return: bitmap index of the pack, without commit bitmaps
+    :rtype: BitmapIndex
+    """
+
+    digests, offsets, _ = read_pack_index(pack_path[:-5] + '.idx')
+    indexes = array.array('L', sorted(range(len(digests)), key=offsets.__getitem__))
+    positions = array.array('L', [0]) * len(indexes)
+    for position, i in enumerate(indexes):
+        positions[i] = position
+    return BitmapIndex(pack_path, digests, positions, indexes, {})
+
+def write_bitmap_index(index):
+    """
+    write .bitmap file of a pack
+
+    :param index: bitmap index of the pack
+    :type index: BitmapIndex
+    """
+
+    pack_sha1 = bytes.fromhex(os.path.basename(index.pack_path)[5:-5])
+    positions = array.array('I', index.positions)
+    indexes = array.array('I', index.indexes)
+    if sys.byteorder == 'big':
+        positions.byteswap()
+        indexes.byteswap()
+    chunks = [
+        BITMAP_SIGNATURE,
+        struct.pack('<LLL', 1, len(index.digests), len(index.commits)),
+        pack_sha1, positions.tobytes(), indexes.tobytes(),
+    ]
+    for sha1, bitmap in sorted(index.commits.items()):
+        words = ewah_encode(bitmap)
+        chunks.append(bytes.fromhex(sha1) + struct.pack('<L', len(words)))
+        chunks.append(struct.pack('<{}Q'.format(len(words)), *words))
+    data = b''.join(chunks)
+    write_file(index.pack_path[:-5] + '.bitmap', data + hashlib.sha1(data).digest())
+
+@functools.lru_cache(maxsize=None)
+def read_bitmap_index(pack_path):
+    """
+    read .bitmap file of a pack
+
+    :param pack_path: path of the pack file
+    :type pack_path: string
+    :return: bitmap index of the pack
+    :rtype: BitmapIndex
+    """
+
+    data = read_file(pack_path[:-5] + '.bitmap')
+    assert hashlib.sha1(memoryview(data)[:-20]).digest() == data[-20:], 'invalid bitmap checksum'
+    signature, version, count, num_commits = struct.unpack_from('<4sLLL', data)
+    assert signature == BITMAP_SIGNATURE and version == 1, 'unsupported bitmap {}'.format(pack_path)
+    pack_sha1 = data[16:36].hex()
+    assert pack_path.endswith('pack-{}.pack'.format(pack_sha1)), 'bitmap is for pack {}'.format(pack_sha1)
+    digests, _, _ = read_pack_index(pack_path[:-5] + '.idx')
+    assert count == len(digests), 'bitmap is for {} objects, pack has {}'.format(count, len(digests))
+    i = 36
+    positions = array.array('I', data[i:i+count*4])
+    indexes = array.array('I', data[i+count*4:i+count*8])
+    if sys.byteorder == 'big':
+        positions.byteswap()
+        indexes.byteswap()
+    i += count*8
+    size = (count + 7) // 8
+    commits = {}
+    for _ in range(num_commits):
+        sha1 = data[i:i+20].hex()
+        num_words = struct.unpack_from('<L', data, i+20)[0]
+        words = struct.unpack_from('<{}Q'.format(num_words), data, i+24)
+        commits[sha1] = ewah_decode(words, size)
+        i += 24 + num_words*8
+    return BitmapIndex(pack_path, digests, positions, indexes, commits)
+
+def load_bitmap_index():
+    """
+    load bitmap index of the repository
+
+    :return: bitmap index of the newest pack with a .bitmap, None if no pack has one
+    :rtype: BitmapIndex
+    """
+
+    packs = [p for p in list_packs() if os.path.exists(p[:-5] + '.bitmap')]
+    if not packs:
+        return None
+    return read_bitmap_index(max(packs, key=os.path.getmtime))
@@ -0,0 +1,220 @@
+"""
+implements checkout subcommand to populate the working copy from a commit
+"""
+
+import concurrent.futures
+import operator
+import os
+import shutil
+import stat
+
+from . import write_file
+from .comp import iter_tree_files, read_commit_tree
+from .indexing import (
+    index_mtime_ns, is_unchanged, make_index_entry, read_index, read_working_file, write_index
+)
+from .objects import hash_object, read_object
+
+def checkout_file(path, mode, sha1):
+    """
+    write a file from the object store
+
+    inflate blob with given SHA-1 and write it to path in the working copy,
+    as a symlink to the blob's contents for mode 120000
+
+    :param path: path of the file
+    :type path: string
+    :param mode: mode of the file from the tree entry
+    :type mode: int
+    :param sha1: SHA-1 hash of the blob
+    :type sha1: hex string
+    :return: index entry of the written file
+    :rtype: IndexEntry
+    """
+
+    obj_type, data = read_object(sha1, view=True)
+    assert obj_type == 'blob', 'object {} is not blob'.format(obj_type)
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.islink(path) or (stat.S_ISLNK(mode) and os.path.lexists(path)):
+        os.remove(path)
+    if stat.S_ISLNK(mode):
+        os.symlink(os.fsdecode(bytes(data)), path)
+    else:
+        write_file(path, data)
+        os.chmod(path, 0o755 if mode & 0o100 else 0o644)
+    return make_index_entry(path, sha1)
+
+def check_path(path):
+    """
+    check that a tree path stays inside the working copy
+
+    :param path: path of a file in the tree
+    :type path: string
+    :raises ValueError: for absolute paths, empty, "." or ".." components and
+        paths inside .pygit
+    """
+
+    parts = path.split('/')
+    if (os.path.isabs(path) or any(part in ('', '.', '..') for part in parts)
+            or parts[0] == '.pygit'):
+        raise ValueError('invalid path {!r} in tree'.format(path))
+
+def is_directory(path):
+    """
+    check for a real directory (not a symlink to one) at path
+    """
+
+    return os.path.isdir(path) and not os.path.islink(path)
+
+def list_files(directory):
+    """
+    list files (and symlinks) under a directory of the working copy
+
+    :param directory: path of the directory
+    :type directory: string
+    :return: paths of the files, recursively
+    :rtype: generator of strings
+    """
+
+    for root, dirs, files in os.walk(directory):
+        for name in files + [d for d in dirs if os.path.islink(os.path.join(root, d))]:
+            yield os.path.join(root, name).replace('\\', '/')
+
+def find_conflicts(to_write, to_remove, entries_by_path):
+    """
+    find working copy changes a checkout would lose
+
+    besides modified tracked files and untracked files at the written paths
+    this reports directories in the way of a written file that hold anything
+    the checkout does not remove, and untracked files in the way of a
+    directory a written file needs.
+
+    :param to_write: (path, mode, SHA-1) of files the checkout writes
+    :type to_write: list
+    :param to_remove: paths the checkout removes
+    :type to_remove: list
+    :param entries_by_path: current index entries by path
+    :type entries_by_path: dict
+    :return: tracked paths with local changes and untracked paths in the way
+    :rtype: tuple
+    """
+
+    index_mtime = index_mtime_ns()
+    removed = set(to_remove)
+    dirty = []
+    untracked = set()
+    parents = set()
+    for path, _, _ in to_write:
+        directory = os.path.dirname(path)
+        while directory and directory not in parents:
+            parents.add(directory)
+            if (os.path.lexists(directory) and not is_directory(directory)
+                    and directory not in removed):
+                untracked.add(directory)
+            directory = os.path.dirname(directory)
+
+    paths = [(path, sha1) for path, _, sha1 in to_write] + [(path, None) for path in to_remove]
+    for path, sha1 in paths:
+        if not os.path.lexists(path):
+            continue
+        entry = entries_by_path.get(path)
+        if is_directory(path):
+            if any(file not in removed for file in list_files(path)):
+                untracked.add(path)
+        elif entry is None:
+            if hash_object(read_working_file(path), 'blob', write=False) != sha1:
+                untracked.add(path)
+        elif not is_unchanged(path, entry, index_mtime):
+            dirty.append(path)
+    return (sorted(dirty), sorted(untracked))
+
+def clear_path(path, parents):
+    """
+    remove what is left in the way of writing a file at path
+
+    :param path: path of the file to write
+    :type path: string
+    :param parents: directories already cleared, updated in place
+    :type parents: set
+    """
+
+    directory = os.path.dirname(path)
+    while directory and directory not in parents:
+        parents.add(directory)
+        if os.path.lexists(directory) and not is_directory(directory):
+            os.remove(directory)
+        directory = os.path.dirname(directory)
+    if is_directory(path):
+        shutil.rmtree(path)
+
+def checkout(commit_sha1, threads=1, force=False):
+    """
+    checkout a commit
+
+    make the working copy and index match the tree of the given commit. Only
+    files whose blob or mode differ from the current index (or that are
+    missing from the working copy) are written, using a pool of "threads"
+    workers, and files in the index but not in the commit are removed.
+    Refs are left untouched. Unless "force" is True, nothing is changed and
+    ValueError is raised when this would overwrite or remove local changes
+    to tracked files or untracked files in the way. Trees with paths outside
+    the working copy or inside .pygit are refused with ValueError.
+
+    :param commit_sha1: SHA-1 hash (or hash prefix) of the commit
+    :type commit_sha1: string
+    :param threads: number of threads writing files, defaults to 1
+    :param threads: int, optional
+    :param force: overwrite local changes, defaults to False
+    :param force: bool, optional
+    """
+
+    files = {path: (mode, sha1) for mode, path, sha1 in iter_tree_files(read_commit_tree(commit_sha1))}
+    for path in files:
+        check_path(path)
+    entries_by_path = {e.path: e for e in read_index()}
+
+    entries = []
+    to_write = []
+    for path, (mode, sha1) in files.items():
+        entry = entries_by_path.get(path)
+        if (entry is not None and entry.sha1.hex() == sha1 and entry.mode == mode
+                and os.path.lexists(path)):
+            entries.append(entry)
+        else:
+            to_write.append((path, mode, sha1))
+
+    to_remove = sorted(set(entries_by_path) - set(files), reverse=True)
+    if not force:
+        dirty, untracked = find_conflicts(to_write, to_remove, entries_by_path)
+        messages = []
+        if dirty:
+            messages.append('local changes to the following files would be overwritten by checkout:')
+            messages.extend('\t' + path for path in dirty)
+        if untracked:
+            messages.append('untracked working tree files would be overwritten by checkout:')
+            messages.extend('\t' + path for path in untracked)
+        if messages:
+            messages.append('commit your changes or use --force to overwrite them')
+            raise ValueError('\n'.join(messages))
+
+    removed = 0
+    for path in to_remove:
+        if os.path.lexists(path) and not is_directory(path):
+            os.remove(path)
+            removed += 1
+        directory = os.path.dirname(path)
+        while directory and os.path.isdir(directory) and not os.listdir(directory):
+            os.rmdir(directory)
+            directory = os.path.dirname(directory)
+    parents = set()
+    for path, _, _ in to_write:
+        clear_path(path, parents)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(threads, 1)) as executor:
+        entries.extend(executor.map(lambda args: checkout_file(*args), to_write))
+    entries.sort(key=operator.attrgetter('path'))
+    write_index(entries)
+    print('checked out {:.7}: {} file{} written, {} removed'.format(
+        commit_sha1, len(to_write), '' if len(to_write) == 1 else 's', removed
+    ))
@@ -43,6 +43,22 @@ def get_local_master_hash():
     except FileNotFoundError:
         return None
     
+def list_refs():
+    """
+    list branch heads of the repository
+
+    :return: ref name -> SHA-1 hash
+    :rtype: dict
+    """
+
+    refs = {}
+    heads_dir = os.path.join('.pygit', 'refs', 'heads')
+    for root, _, files in os.walk(heads_dir):
+        for file in files:
+            path = os.path.join(root, file)
+            refs[os.path.relpath(path, '.pygit').replace('\\', '/')] = read_file(path).decode().strip()
+    return refs
+
 def commit(message, author=None):
     """
     commit the current state
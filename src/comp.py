@@ -1,41 +1,55 @@
 """
 contains all the methods to compare remote and local master branch.
 """
+import difflib
+import functools
 import stat
 
+from .bitmap import bitmap_objects, bitmap_size, load_bitmap_index, object_position
 from .indexing import read_object
 
 def read_tree(sha1=None, data=None):
     """
     read tree object
     
-    read tree object with given SHA-1 hex string or data
+    read tree object with given SHA-1 hex string or data. Entries are parsed
+    in place with bytes.find on the buffer under a memoryview, without
+    copying the body. A memoryview must run to the end of the bytes object
+    it views, like the ones read_object(view=True) returns.
     
     :param sha1: SHA-1 of the tree object, defaults to None
     :param sha1: hex string, optional
     :param data: data of the tree object, defaults to None
-    :param data: byte string, optional
+    :param data: bytes-like object, optional
     :raises TypeError: when neither data nor sha1 string provided
-    :return: entries
-    :rtype: string
+    :return: entries as (mode, path, SHA-1) tuples
+    :rtype: list
     """
 
     if sha1 is not None:
-        obj_type, data = read_object(sha1)
+        obj_type, data = read_object(sha1, view=True)
         assert obj_type == 'tree', 'object {} is not tree'.format(obj_type)
     elif data is None:
         raise TypeError('must specify "sha1" or "data"')
-    i = 0
+    view = memoryview(data)
+    buf = view.obj
+    if not isinstance(buf, bytes):
+        buf = view.tobytes()
+    size = len(buf)
+    find = buf.find
+    i = size - view.nbytes
     entries = []
-    for _ in range(1000):
-        end = data.find(b'\x00')
-        if end == -1:
-            break
-        mode_str, path = data[i:end].decode().split()
-        mode = int(mode_str, 8)
-        digest = data[end+1:end+21]
-        entries.append(mode, path, digest.hex())
-        i = end+1+20
+    # trees only use a handful of modes, parse each one once
+    modes = {}
+    while i < size:
+        end = find(b'\x00', i)
+        assert 0 <= end <= size-21, 'invalid tree entry at offset {}'.format(i)
+        mode_str, path = buf[i:end].split(b' ', 1)
+        mode = modes.get(mode_str)
+        if mode is None:
+            mode = modes[mode_str] = int(mode_str, 8)
+        entries.append((mode, path.decode(), buf[end+1:end+21].hex()))
+        i = end+21
     return entries
 
 def find_tree_objects(tree_sha1):
@@ -82,12 +96,75 @@ def find_commit_objects(commit_sha1):
         objects.update(find_commit_objects(parent))
     return objects
 
+def find_reachable_bitmap(commit_sha1, index, bitmap=None, extra=None):
+    """
+    find objects reachable from a commit using bitmaps
+
+    walk history from the commit, OR-ing in the stored bitmap of any commit
+    that has one instead of walking further, and skipping objects already
+    set. Objects outside the bitmapped pack are collected in "extra". An
+    initial bitmap and extra set (e.g. everything reachable from another
+    commit) can be given to walk only what is not reachable from them.
+
+    :param commit_sha1: SHA-1 hash of the commit
+    :type commit_sha1: string
+    :param index: bitmap index
+    :type index: BitmapIndex
+    :param bitmap: initial bitmap, defaults to None
+    :param bitmap: bytearray, optional
+    :param extra: initial SHA-1 hashes outside the pack, defaults to None
+    :param extra: set, optional
+    :return: bitmap and set of SHA-1 hashes outside the pack
+    :rtype: tuple
+    """
+
+    bitmap = bytearray(bitmap_size(index)) if bitmap is None else bytearray(bitmap)
+    extra = set() if extra is None else set(extra)
+
+    def mark(sha1):
+        position = object_position(index, sha1)
+        if position is None:
+            if sha1 in extra:
+                return False
+            extra.add(sha1)
+        else:
+            if bitmap[position >> 3] & (1 << (position & 7)):
+                return False
+            bitmap[position >> 3] |= 1 << (position & 7)
+        return True
+
+    def mark_tree(tree_sha1):
+        if not mark(tree_sha1):
+            return
+        for mode, path, sha1 in read_tree(sha1=tree_sha1):
+            if stat.S_ISDIR(mode):
+                mark_tree(sha1)
+            else:
+                mark(sha1)
+
+    commits = [commit_sha1]
+    while commits:
+        sha1 = commits.pop()
+        if sha1 in index.commits:
+            combined = int.from_bytes(bitmap, 'little') | int.from_bytes(index.commits[sha1], 'little')
+            bitmap[:] = combined.to_bytes(len(bitmap), 'little')
+            continue
+        if not mark(sha1):
+            continue
+        obj_type, commit = read_object(sha1)
+        assert obj_type == 'commit'
+        lines = commit.decode().splitlines()
+        mark_tree(next(l[5:45] for l in lines if l.startswith('tree ')))
+        commits.extend(l[7:47] for l in lines if l.startswith('parent '))
+    return (bitmap, extra)
+
 def find_missing_objects(local_sha1, remote_sha1):
     """
     find local objects not present in remote
     
     return set of SHA-1 hashes of objects in local commit that are missing
-    at the remote (based on the given remote commit hash).
+    at the remote (based on the given remote commit hash). When the repo has
+    a bitmap index this is a bitmap AND-NOT of what the two commits reach.
     
     :param local_sha1: SHA-1 of local commit
     :type local_sha1: string
@@ -97,8 +174,171 @@ def find_missing_objects(local_sha1, remote_sha1):
     :rtype: list
     """
 
+    index = load_bitmap_index()
+    if index is not None:
+        remote_bitmap = remote_extra = None
+        if remote_sha1 is not None:
+            remote_bitmap, remote_extra = find_reachable_bitmap(remote_sha1, index)
+        local_bitmap, local_extra = find_reachable_bitmap(
+            local_sha1, index, remote_bitmap, remote_extra
+        )
+        missing = int.from_bytes(local_bitmap, 'little')
+        if remote_bitmap is not None:
+            missing &= ~int.from_bytes(remote_bitmap, 'little')
+            local_extra -= remote_extra
+        return bitmap_objects(index, missing) | local_extra
+
     local_objects = find_commit_objects(local_sha1)
     if remote_sha1 is None:
         return local_objects
     remote_objects = find_commit_objects(remote_sha1)
-    return local_objects - remote_objects
\ No newline at end of file
+    return local_objects - remote_objects
+
+def read_commit_tree(commit_sha1):
+    """
+    get tree of a commit
+
+    :param commit_sha1: SHA-1 hash (or hash prefix) of the commit
+    :type commit_sha1: string
+    :return: SHA-1 hash of the commit's tree
+    :rtype: string
+    """
+
+    obj_type, commit = read_object(commit_sha1)
+    assert obj_type == 'commit', 'object {} is not commit'.format(obj_type)
+    lines = commit.decode().splitlines()
+    return next(l[5:45] for l in lines if l.startswith('tree '))
+
+@functools.lru_cache(maxsize=4096)
+def read_tree_cached(sha1):
+    """
+    read tree object once
+
+    read tree object with given SHA-1 hex string, caching parsed entries so
+    trees shared between the compared commits are only parsed once.
+
+    :param sha1: SHA-1 of the tree object
+    :type sha1: hex string
+    :return: entries as (mode, path, SHA-1) tuples
+    :rtype: tuple
+    """
+
+    return tuple(read_tree(sha1=sha1))
+
+def iter_tree_files(tree_sha1, prefix=''):
+    """
+    generate files of a tree
+
+    :param tree_sha1: SHA-1 of the tree object
+    :type tree_sha1: hex string
+    :param prefix: path prefix of the tree, defaults to ''
+    :param prefix: string, optional
+    :return: (mode, path, SHA-1) of every file in the tree, recursively
+    :rtype: generator of tuples
+    """
+
+    for mode, path, sha1 in read_tree(sha1=tree_sha1):
+        if stat.S_ISDIR(mode):
+            yield from iter_tree_files(sha1, prefix + path + '/')
+        else:
+            yield (mode, prefix + path, sha1)
+
+def diff_tree_entries(old_tree, new_tree, prefix=''):
+    """
+    compare two trees
+
+    walk entries of both trees in merged path order, skipping subtrees whose
+    SHA-1 is identical, so the cost is proportional to the change.
+
+    :param old_tree: SHA-1 of the old tree object, None for an empty tree
+    :type old_tree: hex string
+    :param new_tree: SHA-1 of the new tree object, None for an empty tree
+    :type new_tree: hex string
+    :param prefix: path prefix of the trees, defaults to ''
+    :param prefix: string, optional
+    :return: (status, path, old mode, new mode, old SHA-1, new SHA-1) with
+        status A (added), D (deleted) or M (modified); missing sides are None
+    :rtype: generator of tuples
+    """
+
+    if old_tree == new_tree:
+        return
+    old_entries = sorted(read_tree_cached(old_tree), key=lambda e: e[1]) if old_tree else []
+    new_entries = sorted(read_tree_cached(new_tree), key=lambda e: e[1]) if new_tree else []
+    i = j = 0
+    while i < len(old_entries) or j < len(new_entries):
+        old = old_entries[i] if i < len(old_entries) else None
+        new = new_entries[j] if j < len(new_entries) else None
+        if new is None or (old is not None and old[1] < new[1]):
+            new = None
+            i += 1
+        elif old is None or new[1] < old[1]:
+            old = None
+            j += 1
+        else:
+            i += 1
+            j += 1
+            if old[2] == new[2] and old[0] == new[0]:
+                continue
+        old_is_dir = old is not None and stat.S_ISDIR(old[0])
+        new_is_dir = new is not None and stat.S_ISDIR(new[0])
+        path = prefix + (old or new)[1]
+        if old_is_dir or new_is_dir:
+            if old is not None and not old_is_dir:
+                yield ('D', path, old[0], None, old[2], None)
+            yield from diff_tree_entries(
+                old[2] if old_is_dir else None,
+                new[2] if new_is_dir else None,
+                path + '/'
+            )
+            if new is not None and not new_is_dir:
+                yield ('A', path, None, new[0], None, new[2])
+        elif old is None:
+            yield ('A', path, None, new[0], None, new[2])
+        elif new is None:
+            yield ('D', path, old[0], None, old[2], None)
+        else:
+            yield ('M', path, old[0], new[0], old[2], new[2])
+
+def diff_tree(old_commit, new_commit, name_status=False, patch=False):
+    """
+    shows diff between two commits
+
+    print the files changed between the trees of two commits, either as raw
+    lines with modes and hashes or, with "name_status", as status and path.
+    With "patch" a unified diff of the contents follows each file.
+
+    :param old_commit: SHA-1 hash (or hash prefix) of the old commit
+    :type old_commit: string
+    :param new_commit: SHA-1 hash (or hash prefix) of the new commit
+    :type new_commit: string
+    :param name_status: only show status and path, defaults to False
+    :param name_status: bool, optional
+    :param patch: show content diff of changed files, defaults to False
+    :param patch: bool, optional
+    """
+
+    changes = diff_tree_entries(read_commit_tree(old_commit), read_commit_tree(new_commit))
+    for status, path, old_mode, new_mode, old_sha1, new_sha1 in changes:
+        if name_status:
+            print('{}\t{}'.format(status, path))
+        else:
+            print(':{:06o} {:06o} {} {} {}\t{}'.format(
+                old_mode or 0, new_mode or 0, old_sha1 or '0'*40,
+                new_sha1 or '0'*40, status, path
+            ))
+        if patch:
+            old_data = read_object(old_sha1)[1] if old_sha1 else b''
+            new_data = read_object(new_sha1)[1] if new_sha1 else b''
+            old_label = 'a/{}'.format(path) if old_sha1 else '/dev/null'
+            new_label = 'b/{}'.format(path) if new_sha1 else '/dev/null'
+            if b'\x00' in old_data or b'\x00' in new_data:
+                print('Binary files {} and {} differ'.format(old_label, new_label))
+                continue
+            diff_lines = difflib.unified_diff(
+                old_data.decode(errors='replace').splitlines(),
+                new_data.decode(errors='replace').splitlines(),
+                old_label, new_label, lineterm=''
+            )
+            for line in diff_lines:
+                print(line)
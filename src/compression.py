@@ -0,0 +1,125 @@
+"""
+chooses zlib compression levels for object and pack writes and keeps stats
+"""
+
+import os
+import threading
+import time
+import zlib
+
+# Default zlib level per operation, overridable with PYGIT_COMPRESSION_<OPERATION>
+LEVELS = {
+    'loose': 1,
+    'pack': 6,
+    'repack': 9,
+}
+
+# Blobs larger than this are always written at level 1 at most
+HUGE_OBJECT_SIZE = 32 * 1024 * 1024
+
+# Objects smaller than this are compressed without probing
+PROBE_MIN_SIZE = 16 * 1024
+PROBE_SAMPLE_SIZE = 4 * 1024
+PROBE_MAX_RATIO = 0.95
+
+# operation -> [objects, raw bytes, compressed bytes, CPU seconds, incompressible]
+STATS = {}
+STATS_LOCK = threading.Lock()
+
+def get_level(operation):
+    """
+    get compression level for an operation
+
+    :param operation: kind of write (loose, pack or repack)
+    :type operation: string
+    :raises ValueError: when the environment variable is not a level from -1 to 9
+    :return: zlib compression level
+    :rtype: int
+    """
+
+    env_name = 'PYGIT_COMPRESSION_{}'.format(operation.upper())
+    if env_name not in os.environ:
+        return LEVELS[operation]
+    value = os.environ[env_name]
+    try:
+        level = int(value)
+    except ValueError:
+        level = None
+    if level is None or not -1 <= level <= 9:
+        raise ValueError('{}={!r} is not a compression level from -1 to 9'.format(env_name, value))
+    return level
+
+def is_incompressible(data):
+    """
+    probe data for compressibility
+
+    compress a few samples of data (start, middle and end) at level 1 and
+    report whether they shrink by less than PROBE_MAX_RATIO, as happens for
+    already compressed media (jpg, zip, gz).
+
+    :param data: data to probe
+    :type data: bytes-like object
+    :return: True when compressing data is not worth it
+    :rtype: bool
+    """
+
+    if len(data) < PROBE_MIN_SIZE:
+        return False
+    view = memoryview(data)
+    middle = (len(data) - PROBE_SAMPLE_SIZE) // 2
+    raw_size = compressed_size = 0
+    for start in (0, middle, len(data) - PROBE_SAMPLE_SIZE):
+        sample = view[start:start+PROBE_SAMPLE_SIZE]
+        raw_size += len(sample)
+        compressed_size += len(zlib.compress(sample, 1))
+    return compressed_size > raw_size * PROBE_MAX_RATIO
+
+def compress(data, operation='loose'):
+    """
+    compress data for an operation
+
+    compress data with the level configured for the operation, falling back
+    to level 0 for incompressible data and to level 1 for huge objects, and
+    record the result in STATS.
+
+    :param data: data to compress
+    :type data: bytes-like object
+    :param operation: kind of write (loose, pack or repack), defaults to 'loose'
+    :param operation: string, optional
+    :return: compressed data
+    :rtype: bytes
+    """
+
+    start = time.thread_time()
+    incompressible = is_incompressible(data)
+    if incompressible:
+        level = 0
+    elif len(data) > HUGE_OBJECT_SIZE:
+        level = min(get_level(operation), 1)
+    else:
+        level = get_level(operation)
+    compressed = zlib.compress(data, level)
+    seconds = time.thread_time() - start
+    with STATS_LOCK:
+        stats = STATS.setdefault(operation, [0, 0, 0, 0.0, 0])
+        stats[0] += 1
+        stats[1] += len(data)
+        stats[2] += len(compressed)
+        stats[3] += seconds
+        stats[4] += incompressible
+    return compressed
+
+def print_stats():
+    """
+    print compression stats
+
+    print, per operation, the number of objects compressed, the size reduction
+    achieved and the CPU time spent on it.
+    """
+
+    for operation, (count, raw_size, compressed_size, seconds, stored) in sorted(STATS.items()):
+        print('{}: {} object{} ({} stored), {} -> {} bytes ({:.1%}) in {:.3f}s CPU ({:.1f} MB/s)'.format(
+            operation, count, '' if count == 1 else 's', stored, raw_size,
+            compressed_size, compressed_size / raw_size if raw_size else 1,
+            seconds, raw_size / seconds / 1e6 if seconds else 0
+        ))
@@ -0,0 +1,328 @@
+"""
+implements import subcommand to bulk load a stream of commits into a pack
+"""
+
+import os
+import stat
+import time
+
+from . import read_file, write_file
+from .comp import read_commit_tree, read_tree
+from .compression import print_stats
+from .objects import read_object
+from .pack import PackWriter
+
+class ImportTree:
+    """
+    In-memory tree being imported
+
+    entries map a name to (mode, SHA-1) for files and (mode, ImportTree) for
+    directories. Trees that already exist (in the repository or the pack
+    being written) are only read when modified, and sha1 is reset to None on
+    every change so only modified trees get written.
+    """
+
+    def __init__(self, pack, sha1=None):
+        self.pack = pack
+        self.sha1 = sha1
+        self._entries = None if sha1 else {}
+
+    @property
+    def entries(self):
+        if self._entries is None:
+            if self.sha1 in self.pack:
+                obj_type, data = self.pack.read(self.sha1)
+            else:
+                obj_type, data = read_object(self.sha1, view=True)
+            assert obj_type == 'tree', 'object {} is not tree'.format(obj_type)
+            self._entries = {}
+            for mode, path, sha1 in read_tree(data=data):
+                value = ImportTree(self.pack, sha1) if stat.S_ISDIR(mode) else sha1
+                self._entries[path] = (mode, value)
+        return self._entries
+
+    def set(self, path, mode, sha1):
+        """
+        add or replace file at path
+
+        :param path: path of the file in this tree
+        :type path: string
+        :param mode: mode of the file
+        :type mode: int
+        :param sha1: SHA-1 hash of the file's blob
+        :type sha1: hex string
+        """
+
+        entries = self.entries
+        self.sha1 = None
+        name, _, rest = path.partition('/')
+        if not rest:
+            entries[name] = (mode, sha1)
+            return
+        entry = entries.get(name)
+        if entry is None or not stat.S_ISDIR(entry[0]):
+            entry = (stat.S_IFDIR, ImportTree(self.pack))
+            entries[name] = entry
+        entry[1].set(rest, mode, sha1)
+
+    def remove(self, path):
+        """
+        remove file or directory at path, if present
+
+        :param path: path in this tree
+        :type path: string
+        """
+
+        entries = self.entries
+        name, _, rest = path.partition('/')
+        entry = entries.get(name)
+        if entry is None:
+            return
+        self.sha1 = None
+        if not rest:
+            del entries[name]
+        elif stat.S_ISDIR(entry[0]):
+            entry[1].remove(rest)
+            if not entry[1].entries:
+                del entries[name]
+
+    def write(self):
+        """
+        write modified trees to the pack
+
+        :return: SHA-1 hash of this tree
+        :rtype: hex string
+        """
+
+        if self.sha1 is not None:
+            return self.sha1
+        tree_entries = []
+        for name, (mode, value) in self.entries.items():
+            if stat.S_ISDIR(mode):
+                tree_entries.append((name + '/', '{:o} {}'.format(mode, name).encode(), value.write()))
+            else:
+                tree_entries.append((name, '{:o} {}'.format(mode, name).encode(), value))
+        tree_entries.sort()
+        data = b''.join(mode_path + b'\x00' + bytes.fromhex(sha1) for _, mode_path, sha1 in tree_entries)
+        self.sha1 = self.pack.add(data, 'tree')
+        return self.sha1
+
+# File modes accepted in "M" commands, with the short forms fast-import allows
+FILE_MODES = {
+    b'644': 0o100644, b'100644': 0o100644,
+    b'755': 0o100755, b'100755': 0o100755,
+    b'120000': 0o120000, b'040000': 0o040000,
+}
+
+def parse_mode(mode):
+    """
+    parse mode of an "M" command
+
+    :param mode: mode as given in the stream
+    :type mode: bytes
+    :raises ValueError: for modes git does not allow in trees
+    :return: normalized mode
+    :rtype: int
+    """
+
+    if mode not in FILE_MODES:
+        raise ValueError('invalid file mode {!r}'.format(mode.decode(errors='replace')))
+    return FILE_MODES[mode]
+
+def resolve_from(value, pack, heads, marks):
+    """
+    resolve the commit of a "from" command
+
+    :param value: mark (":<n>"), branch ref or SHA-1 hash of the commit
+    :type value: bytes
+    :param pack: pack being written
+    :type pack: PackWriter
+    :param heads: ref -> (commit SHA-1, ImportTree) of refs imported so far
+    :type heads: dict
+    :param marks: mark -> (commit SHA-1, tree SHA-1) of marked commits
+    :type marks: dict
+    :raises ValueError: when the commit cannot be resolved
+    :return: commit SHA-1 and tree SHA-1
+    :rtype: tuple
+    """
+
+    if value in marks:
+        return marks[value]
+    name = value.decode(errors='replace')
+    if value.startswith(b':'):
+        raise ValueError('unknown mark {}'.format(name))
+    if value.startswith(b'refs/'):
+        if name in heads:
+            parent, tree = heads[name]
+            return (parent, tree.sha1)
+        try:
+            parent = read_file(os.path.join('.pygit', name)).decode().strip()
+        except FileNotFoundError:
+            raise ValueError('unknown ref {}'.format(name))
+        return (parent, read_commit_tree(parent))
+    if len(value) != 40 or value.strip(b'0123456789abcdef'):
+        raise ValueError('invalid commit {!r} in from command'.format(name))
+    if name in pack:
+        obj_type, commit = pack.read(name)
+        if obj_type != 'commit':
+            raise ValueError('object {} is not commit'.format(name))
+        lines = commit.decode().splitlines()
+        return (name, next(l[5:45] for l in lines if l.startswith('tree ')))
+    return (name, read_commit_tree(name))
+
+def parse_path(path):
+    """
+    parse path of an "M" or "D" command
+
+    :param path: path as given in the stream
+    :type path: bytes
+    :raises ValueError: for paths with empty, "." or ".." components
+    :return: path
+    :rtype: string
+    """
+
+    name = path.decode()
+    if any(part in ('', '.', '..') for part in name.split('/')):
+        raise ValueError('invalid path {!r}'.format(name))
+    return name
+
+def read_data(stream, line):
+    """
+    read a "data <count>" block
+
+    :param stream: binary input stream
+    :type stream: file object
+    :param line: the "data <count>" command line
+    :type line: bytes
+    :return: data of the block
+    :rtype: bytes
+    """
+
+    assert line.startswith(b'data '), 'expected data command, got {!r}'.format(line)
+    count = int(line[5:])
+    data = stream.read(count)
+    assert len(data) == count, 'expected {} bytes of data, got {}'.format(count, len(data))
+    return data
+
+def read_line_after_data(stream):
+    """
+    read the line following a data block, skipping the optional LF after it
+
+    :param stream: binary input stream
+    :type stream: file object
+    :return: next line
+    :rtype: bytes
+    """
+
+    line = stream.readline()
+    if line == b'\n':
+        line = stream.readline()
+    return line
+
+def fast_import(stream):
+    """
+    import commits from a stream
+
+    read a git fast-import style stream of commits (commit, mark, author,
+    committer, data, from, M <mode> inline <path>, D <path>, deleteall and
+    done commands) and write all blobs, trees and commits into a single new
+    pack, keeping the trees in memory. Refs are updated once at the end; on
+    error the partial pack is removed and no ref is changed.
+
+    :param stream: binary input stream
+    :type stream: file object
+    :return: SHA-1 hash of the last commit of each imported ref
+    :rtype: dict
+    """
+
+    start = time.perf_counter()
+    pack = PackWriter()
+    heads = {}
+    marks = {}
+    commits = 0
+    try:
+        line = stream.readline()
+        while line:
+            line = line.rstrip(b'\n')
+            if not line:
+                line = stream.readline()
+                continue
+            if line == b'done':
+                break
+            assert line.startswith(b'commit '), 'unexpected command {!r}'.format(line)
+            ref = line[7:].decode()
+            assert ref.startswith('refs/heads/'), 'unsupported ref {}'.format(ref)
+            if ref not in heads:
+                try:
+                    parent = read_file(os.path.join('.pygit', ref)).decode().strip()
+                except FileNotFoundError:
+                    parent = None
+                heads[ref] = (parent, ImportTree(pack, read_commit_tree(parent) if parent else None))
+            parent, tree = heads[ref]
+            mark = None
+            author = None
+            committer = None
+            line = stream.readline().rstrip(b'\n')
+            if line.startswith(b'mark '):
+                mark = line[5:]
+                line = stream.readline().rstrip(b'\n')
+            if line.startswith(b'author '):
+                author = line[7:]
+                line = stream.readline().rstrip(b'\n')
+            assert line.startswith(b'committer '), 'expected committer, got {!r}'.format(line)
+            committer = line[10:]
+            message = read_data(stream, stream.readline().rstrip(b'\n'))
+            line = read_line_after_data(stream)
+            if line.startswith(b'from '):
+                parent, tree_sha1 = resolve_from(line[5:].rstrip(b'\n'), pack, heads, marks)
+                tree = ImportTree(pack, tree_sha1)
+                line = stream.readline()
+            while line.rstrip(b'\n'):
+                line = line.rstrip(b'\n')
+                if line.startswith(b'M '):
+                    mode, dataref, path = line[2:].split(b' ', 2)
+                    mode = parse_mode(mode)
+                    assert dataref == b'inline', 'only inline file data is supported'
+                    assert not stat.S_ISDIR(mode), 'inline data cannot be a tree'
+                    path = parse_path(path)
+                    sha1 = pack.add(read_data(stream, stream.readline().rstrip(b'\n')), 'blob')
+                    tree.set(path, mode, sha1)
+                    line = read_line_after_data(stream)
+                    continue
+                elif line.startswith(b'D '):
+                    tree.remove(parse_path(line[2:]))
+                elif line == b'deleteall':
+                    tree = ImportTree(pack)
+                else:
+                    break
+                line = stream.readline()
+            else:
+                line = stream.readline()
+
+            lines = [b'tree ' + tree.write().encode()]
+            if parent:
+                lines.append(b'parent ' + parent.encode())
+            lines.append(b'author ' + (author or committer))
+            lines.append(b'committer ' + committer)
+            lines.append(b'')
+            parent = pack.add(b'\n'.join(lines) + b'\n' + message, 'commit')
+            heads[ref] = (parent, tree)
+            if mark is not None:
+                marks[mark] = (parent, tree.sha1)
+            commits += 1
+    except BaseException:
+        pack.abort()
+        raise
+
+    num_objects = len(pack.objects)
+    pack_path = pack.close()
+    for ref, (sha1, _) in heads.items():
+        write_file(os.path.join('.pygit', ref), (sha1 + '\n').encode())
+    seconds = time.perf_counter() - start
+    print('imported {} commit{} ({} objects, {} bytes) in {:.3f}s ({:.0f} objects/s)'.format(
+        commits, '' if commits == 1 else 's', num_objects,
+        os.path.getsize(pack_path) if pack_path else 0, seconds,
+        num_objects / seconds if seconds else 0
+    ))
+    print_stats()
+    return {ref: sha1 for ref, (sha1, _) in heads.items()}
@@ -0,0 +1,187 @@
+"""
+implements fsck subcommand to verify the object store and index
+"""
+
+import concurrent.futures
+import hashlib
+import os
+import stat
+import sys
+import time
+import zlib
+
+from . import read_file
+from .commit import list_refs
+from .comp import read_tree
+from .indexing import read_index
+from .pack import decode_pack_data, list_packs, read_pack_index
+
+def list_objects():
+    """
+    list all objects of the repository
+
+    :return: (SHA-1, pack path or None, offset, stored size) of every loose
+        and packed object
+    :rtype: list
+    """
+
+    objects = []
+    objects_dir = os.path.join('.pygit', 'objects')
+    for prefix in sorted(os.listdir(objects_dir)):
+        if len(prefix) != 2:
+            continue
+        for rest in sorted(os.listdir(os.path.join(objects_dir, prefix))):
+            objects.append((prefix + rest, None, 0, 0))
+    for pack_path in list_packs():
+        digests, offsets, sizes = read_pack_index(pack_path[:-5] + '.idx')
+        for digest, offset, size in zip(digests, offsets, sizes):
+            objects.append((digest.hex(), pack_path, offset, size))
+    return objects
+
+def verify_object(obj):
+    """
+    verify a single object
+
+    inflate and re-hash the object and list the objects it references
+
+    :param obj: SHA-1, pack path or None, offset and stored size of the object
+    :type obj: tuple
+    :return: SHA-1, object type, inflated size, error (None when the object is
+        fine) and list of (SHA-1, expected type) it references
+    :rtype: tuple
+    """
+
+    sha1, pack_path, offset, stored_size = obj
+    try:
+        if pack_path is None:
+            full_data = zlib.decompress(read_file(os.path.join('.pygit', 'objects', sha1[:2], sha1[2:])))
+            null_index = full_data.index(b'\x00')
+            obj_type, size_str = full_data[:null_index].decode().split()
+            data = memoryview(full_data)[null_index+1:]
+            assert int(size_str) == len(data), 'expected size {}, got {} bytes'.format(size_str, len(data))
+            digest = hashlib.sha1(full_data).hexdigest()
+        else:
+            with open(pack_path, 'rb') as fh:
+                fh.seek(offset)
+                obj_type, data = decode_pack_data(fh.read(stored_size))
+            digest = hashlib.sha1('{} {}\x00'.format(obj_type, len(data)).encode())
+            digest.update(data)
+            digest = digest.hexdigest()
+        assert digest == sha1, 'hash mismatch, content hashes to {}'.format(digest)
+        references = []
+        if obj_type == 'tree':
+            for mode, _, entry_sha1 in read_tree(data=data):
+                references.append((entry_sha1, 'tree' if stat.S_ISDIR(mode) else 'blob'))
+        elif obj_type == 'commit':
+            for line in bytes(data).decode().splitlines():
+                if not line:
+                    break
+                if line.startswith('tree '):
+                    references.append((line[5:45], 'tree'))
+                elif line.startswith('parent '):
+                    references.append((line[7:47], 'commit'))
+        return (sha1, obj_type, len(data), None, references)
+    except Exception as error:
+        return (sha1, None, 0, str(error) or type(error).__name__, [])
+
+def verify_pack_checksum(pack_path):
+    """
+    verify SHA-1 trailer of a pack file
+
+    :param pack_path: path of the pack file
+    :type pack_path: string
+    :return: True when the trailer matches the pack contents
+    :rtype: bool
+    """
+
+    size = os.path.getsize(pack_path) - 20
+    sha1 = hashlib.sha1()
+    with open(pack_path, 'rb') as fh:
+        while size > 0:
+            chunk = fh.read(min(size, 1 << 20))
+            sha1.update(chunk)
+            size -= len(chunk)
+        return sha1.digest() == fh.read(20)
+
+def fsck(processes=None):
+    """
+    verify the repository
+
+    re-inflate and re-hash every loose and packed object across a pool of
+    processes, check that trees, commits, refs and the index only reference
+    existing objects of the right type, and report dangling objects (not
+    referenced by anything). Prints progress and throughput to stderr.
+
+    :param processes: number of worker processes, defaults to CPU count
+    :param processes: int, optional
+    :raises ValueError: when processes is less than 1
+    :return: number of problems found
+    :rtype: int
+    """
+
+    if processes is not None and processes < 1:
+        raise ValueError('number of processes must be at least 1, got {}'.format(processes))
+    start = time.perf_counter()
+    objects = list_objects()
+    problems = 0
+    for pack_path in list_packs():
+        if not verify_pack_checksum(pack_path):
+            print('error: bad pack checksum in {}'.format(pack_path))
+            problems += 1
+
+    types = {}
+    corrupt = set()
+    # SHA-1 -> [(expected type, referenced by)] of every reference to it
+    referenced = {}
+    total_bytes = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+        results = executor.map(verify_object, objects, chunksize=256)
+        for checked, (sha1, obj_type, size, error, references) in enumerate(results, 1):
+            if error is not None:
+                print('error: object {}: {}'.format(sha1, error))
+                corrupt.add(sha1)
+                problems += 1
+            else:
+                types[sha1] = obj_type
+                total_bytes += size
+                for ref_sha1, ref_type in references:
+                    referenced.setdefault(ref_sha1, []).append((ref_type, sha1))
+            if checked % 1000 == 0 or checked == len(objects):
+                print('\rchecking objects: {}/{}'.format(checked, len(objects)),
+                    end='', file=sys.stderr)
+    if objects:
+        print(file=sys.stderr)
+
+    for name, sha1 in sorted(list_refs().items()):
+        referenced.setdefault(sha1, []).append(('commit', name))
+    try:
+        for entry in read_index():
+            referenced.setdefault(entry.sha1.hex(), []).append(('blob', 'index'))
+    except AssertionError as error:
+        print('error: index: {}'.format(error))
+        problems += 1
+
+    for sha1, references in sorted(referenced.items()):
+        if sha1 in corrupt:
+            continue
+        if sha1 not in types:
+            expected_type, source = references[0]
+            print('missing {} {} (referenced by {})'.format(expected_type, sha1, source))
+            problems += 1
+            continue
+        for expected_type, source in references:
+            if types[sha1] != expected_type:
+                print('error: {} is a {}, expected {} (referenced by {})'.format(
+                    sha1, types[sha1], expected_type, source
+                ))
+                problems += 1
+    for sha1 in sorted(set(types) - set(referenced)):
+        print('dangling {} {}'.format(types[sha1], sha1))
+
+    seconds = time.perf_counter() - start
+    print('checked {} object{} ({} bytes) in {:.3f}s ({:.0f} objects/s, {:.1f} MB/s)'.format(
+        len(objects), '' if len(objects) == 1 else 's', total_bytes, seconds,
+        len(objects) / seconds if seconds else 0,
+        total_bytes / seconds / 1e6 if seconds else 0
+    ), file=sys.stderr)
+    return problems
@@ -5,6 +5,7 @@ stores functions related to indexing of file and storing them
 import collections
 import hashlib
 import os
+import stat
 import struct
 import difflib
 import operator
@@ -18,6 +19,10 @@ IndexEntry = collections.namedtuple('IndexEntry', [
     'gid', 'size', 'sha1', 'flags', 'path'
 ])
 
+# Fixed-size header of the index file and of each entry (path follows it)
+INDEX_HEADER = struct.Struct('!4sLL')
+INDEX_ENTRY = struct.Struct('!LLLLLLLLLL20sH')
+
 def read_index():
     """
     read git index file to get list of IndexEntry objects
@@ -30,27 +35,55 @@ def read_index():
     except FileNotFoundError:
         return []
 
-    digest = hashlib.sha1(data[:-20]).digest()
-    assert digest == data[-20:], 'invalid index checksum'
-    signature, version, num_entries = struct.unpack('!4sLL', data[:12])
+    view = memoryview(data)
+    digest = hashlib.sha1(view[:-20]).digest()
+    assert digest == view[-20:], 'invalid index checksum'
+    signature, version, num_entries = INDEX_HEADER.unpack_from(data)
     assert signature == b'DIRC', 'invalid index signature {}'.format(signature)
     assert version == 2, 'unknown index version {}'.format(version)
 
-    entry_data = data[12:-20]
     entries = []
-    i = 0
-    while i+62 < len(entry_data):
+    i = INDEX_HEADER.size
+    entries_end = len(data) - 20
+    while i+62 < entries_end:
         fields_end = i+62
-        fields = struct.unpack('!LLLLLLLLLL20sH', entry_data[i:fields_end])
-        path_end = entry_data.index(b'\x00', fields_end)
-        path = entry_data[fields_end:path_end]
-        entry = IndexEntry(*(fields+(path.decode(),)))
-        entries.append(entry)
-        entry_len = ((62+len(path)+8)//8)*8
+        fields = INDEX_ENTRY.unpack_from(data, i)
+        path_end = data.index(b'\x00', fields_end, entries_end)
+        path = str(view[fields_end:path_end], 'utf-8')
+        entries.append(IndexEntry(*(fields+(path,))))
+        entry_len = ((62+path_end-fields_end+8)//8)*8
         i += entry_len
     assert len(entries) == num_entries, 'number of entries {} is not correct'.format(len(entries))
     return entries
 
+def read_working_file(path):
+    """
+    read data of a working copy file as stored in its blob
+
+    :param path: path of the file
+    :type path: string
+    :return: contents of the file, or the target of a symlink
+    :rtype: bytes
+    """
+
+    if os.path.islink(path):
+        return os.fsencode(os.readlink(path))
+    return read_file(path)
+
+def index_mode(st_mode):
+    """
+    normalize file mode the way git records it
+
+    :param st_mode: mode from os.lstat()
+    :type st_mode: int
+    :return: 0o120000 for symlinks, 0o100755 for executable files, 0o100644 otherwise
+    :rtype: int
+    """
+
+    if stat.S_ISLNK(st_mode):
+        return 0o120000
+    return 0o100755 if st_mode & 0o100 else 0o100644
+
 def ls_files(details=False):
     """
     print list of files
@@ -75,19 +108,61 @@ def get_status():
     paths = set()
     for root, dirs, files in os.walk('.'):
         dirs[:] = [d for d in dirs if d != '.pygit']
-        for file in files:
+        links = [d for d in dirs if os.path.islink(os.path.join(root, d))]
+        for file in files + links:
             path = os.path.join(root,file)
             path = path.replace('\\', '/')
             if path.startswith('./'):
                 path = path[2:]
             paths.add(path)
-        entries_by_path = {e.path: e for e in read_index()}
-        entry_paths = set(entries_by_path)
-        changed = {p for p in (paths & entry_paths) 
-            if hash_object(read_file(p), 'blob', write=False) != entries_by_path[p].sha1.hex()}
-        new = paths - entry_paths
-        deleted = entry_paths - paths
-        return (sorted(changed), sorted(new), sorted(deleted))
+    entries_by_path = {e.path: e for e in read_index()}
+    entry_paths = set(entries_by_path)
+    index_mtime = index_mtime_ns()
+    changed = {p for p in (paths & entry_paths)
+        if not is_unchanged(p, entries_by_path[p], index_mtime)}
+    new = paths - entry_paths
+    deleted = entry_paths - paths
+    return (sorted(changed), sorted(new), sorted(deleted))
+
+def index_mtime_ns():
+    """
+    get modification time of the index file
+
+    :return: mtime in nanoseconds, None if there is no index
+    :rtype: int
+    """
+
+    try:
+        return os.stat(os.path.join('.pygit', 'index')).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def is_unchanged(path, entry, index_mtime=None):
+    """
+    check a working copy file against its index entry
+
+    a file whose size and mtime (to the nanosecond) match the index entry is
+    taken as unchanged without reading it, unless it is "racily clean": its
+    mtime is not older than the index file, so it may have been modified
+    after its entry was recorded. Otherwise its contents are hashed and
+    compared.
+
+    :param path: path of the file
+    :type path: string
+    :param entry: index entry of the file
+    :type entry: IndexEntry
+    :param index_mtime: mtime of the index file in nanoseconds, defaults to None
+    :param index_mtime: int, optional
+    :return: True when the file matches the index entry
+    :rtype: bool
+    """
+
+    st = os.lstat(path)
+    racy = index_mtime is None or st.st_mtime_ns >= index_mtime
+    if (not racy and st.st_size & 0xffffffff == entry.size
+            and divmod(st.st_mtime_ns, 10**9) == (entry.mtime_s, entry.mtime_n)):
+        return True
+    return hash_object(read_working_file(path), 'blob', write=False) == entry.sha1.hex()
 
 def status():
     """
@@ -146,31 +221,50 @@ def write_index(entries):
 
     packed_entries = []
     for entry in entries:
-        entry_head = struct.pack('!LLLLLLLLLL20sH',
+        entry_head = INDEX_ENTRY.pack(
         entry.ctime_s, entry.ctime_n, entry.mtime_s, entry.mtime_n, entry.dev, entry.ino, 
         entry.mode, entry.uid, entry.gid, entry.size, entry.sha1, entry.flags)
         path = entry.path.encode()
-        length = ((62 + len(path))//8) * 8
+        length = ((62 + len(path) + 8)//8) * 8
         packed_entry = entry_head + path + b'\x00' * (length - 62 - len(path))
         packed_entries.append(packed_entry)
-    header = struct.pack('!4sLL', b'DIRC', len(entries))
+    header = INDEX_HEADER.pack(b'DIRC', 2, len(entries))
     all_data = header + b''.join(packed_entries)
     digest = hashlib.sha1(all_data).digest()
     write_file(os.path.join('.pygit', 'index'), all_data + digest)
 
+def make_index_entry(path, sha1):
+    """
+    build IndexEntry
+
+    build an IndexEntry for the file at path with stat data of the file (or
+    symlink), its mode normalized as by index_mode()
+
+    :param path: path of the file
+    :type path: string
+    :param sha1: SHA-1 hash of the file's blob
+    :type sha1: hex string
+    :return: index entry of the file
+    :rtype: IndexEntry
+    """
+
+    st = os.lstat(path)
+    flags = len(path.encode())
+    assert flags < (1 << 12)
+    ctime_s, ctime_n = divmod(st.st_ctime_ns, 10**9)
+    mtime_s, mtime_n = divmod(st.st_mtime_ns, 10**9)
+    return IndexEntry(
+        ctime_s, ctime_n, mtime_s, mtime_n, st.st_dev & 0xffffffff,
+        st.st_ino & 0xffffffff, index_mode(st.st_mode), st.st_uid & 0xffffffff,
+        st.st_gid & 0xffffffff, st.st_size & 0xffffffff, bytes.fromhex(sha1), flags, path
+    )
+
 def add(paths):
     paths = [p.replace('\\', '/') for p in paths]
     all_entries = read_index()
     entries = [e for e in all_entries if e.path not in paths]
     for path in paths:
-        sha1 = hash_object(read_file(path), 'blob')
-        st = os.stat(path)
-        flags = len(path.encode())
-        assert flags < (1 << 12)
-        entry = IndexEntry(
-            int(st.st_ctime), 0, int(st.st_mtime), 0, st.st_dev, st.st_ino, st.st_mode,
-            st.st_uid, st.st_gid, st.st_size, bytes.fromhex(sha1), flags, path
-        )
-        entries.append(entry)
+        sha1 = hash_object(read_working_file(path), 'blob')
+        entries.append(make_index_entry(path, sha1))
     entries.sort(key=operator.attrgetter('path'))
-    write_index(entries)
\ No newline at end of file
+    write_index(entries)
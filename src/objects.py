@@ -9,6 +9,8 @@ import hashlib
 import zlib
 
 from . import write_file, read_file
+from .compression import compress
+from .pack import decode_pack_header, find_packed_object, read_packed_object
 
 
 def hash_object(data, obj_type, write=True):
@@ -25,16 +27,34 @@ def hash_object(data, obj_type, write=True):
     :param write: creation of path/file inside git directory, defaults to True
     :param write: bool, optional
     """
-    header = '{} {}'.format(obj_type, len(data).encode())
+    header = '{} {}'.format(obj_type, len(data)).encode()
     full_data = header + b'\x00' + data
     sha1 = hashlib.sha1(full_data).hexdigest()
     if write:
         path = os.path.join('.pygit', 'objects', sha1[:2], sha1[2:])
         if not os.path.exists(path):
             os.makedirs(os.path.dirname(path), exist_ok=True)
-            write_file(path, zlib.compress(full_data))
+            write_file(path, compress(full_data, 'loose'))
     return sha1
 
+def find_loose_objects(sha1_prefix):
+    """
+    find loose objects by hash prefix
+
+    :param sha1_prefix: SHA1 prefix of the object
+    :type sha1_prefix: HexString
+    :return: SHA-1 hashes of the loose objects matching the prefix
+    :rtype: list
+    """
+    if len(sha1_prefix)<2:
+        raise ValueError('hash prefix must be greater than 2 characters')
+    obj_dir = os.path.join('.pygit', 'objects', sha1_prefix[:2])
+    rest = sha1_prefix[2:]
+    try:
+        return [sha1_prefix[:2] + name for name in os.listdir(obj_dir) if name.startswith(rest)]
+    except FileNotFoundError:
+        return []
+
 def find_object(sha1_prefix):
     """
     find object by hash prefix
@@ -45,40 +65,78 @@ def find_object(sha1_prefix):
     :param sha1_prefix: SHA1 prefix of the object
     :type sha1_prefix: HexString
     """
-    if len(sha1_prefix)<2:
-        raise ValueError('hash prefix must be greater than 2 characters')
-    obj_dir = os.path.join('.pygit', 'objects', sha1_prefix[:2])
-    rest = sha1_prefix[2:]
-    objects = [name for name in os.listdir(obj_dir) if name.startswith(rest)]
+    objects = find_loose_objects(sha1_prefix)
     if not objects:
         raise ValueError('object {!r} not found!'.format(sha1_prefix))
     if len(objects) >= 2:
         raise ValueError('multiple objects with the hash prefix {!r} found!'.format(sha1_prefix))
-    return os.path.join(obj_dir, objects[0])
+    return os.path.join('.pygit', 'objects', objects[0][:2], objects[0][2:])
+
+def object_size(sha1):
+    """
+    get inflated size of an object
 
-def read_object(sha1_prefix):
+    return the size of the object's data, whether loose or packed, by
+    decoding only its header
+
+    :param sha1: SHA-1 hash of the object
+    :type sha1: hex string
+    :return: size in bytes
+    :rtype: int
+    """
+
+    path = os.path.join('.pygit', 'objects', sha1[:2], sha1[2:])
+    if os.path.exists(path):
+        with open(path, 'rb') as fh:
+            header = zlib.decompressobj().decompress(fh.read(512), 64)
+        return int(header[:header.index(b'\x00')].split()[1])
+    packed = find_packed_object(sha1)
+    if packed is None:
+        raise ValueError('object {!r} not found!'.format(sha1))
+    pack_path, offset, _ = packed
+    with open(pack_path, 'rb') as fh:
+        fh.seek(offset)
+        return decode_pack_header(fh.read(16))[1]
+
+def read_object(sha1_prefix, view=False):
     """
     read object by the provided sha1_prefix
     
-    Read object with the given SHA1 prefix and return tuple of object type and
-    the data in the object
+    Read object with the given SHA1 prefix, loose or packed, and return tuple
+    of object type and the data in the object. When "view" is True the data is returned as a
+    memoryview over the inflated object instead of a copy of its body.
     
     :param sha1_prefix: SHA1 prefix generated for the file
     :type sha1_prefix: HexString
+    :param view: return a memoryview instead of bytes, defaults to False
+    :param view: bool, optional
     :return: object type and data inside the object
     :rtype: tuple
     """
 
-    path = find_object(sha1_prefix)
+    loose = find_loose_objects(sha1_prefix)
+    packed = None
+    if len(sha1_prefix) < 40 or not loose:
+        packed = find_packed_object(sha1_prefix)
+    # a prefix is ambiguous when it matches different loose and packed objects
+    if len(loose) >= 2 or (loose and packed is not None and find_packed_object(loose[0]) is None):
+        raise ValueError('multiple objects with the hash prefix {!r} found!'.format(sha1_prefix))
+    if not loose:
+        if packed is None:
+            raise ValueError('object {!r} not found!'.format(sha1_prefix))
+        obj_type, data = read_packed_object(*packed)
+        return (obj_type, memoryview(data) if view else data)
+    path = os.path.join('.pygit', 'objects', loose[0][:2], loose[0][2:])
     full_data = zlib.decompress(read_file(path))
     null_index = full_data.index(b'\x00')
-    header = full_data[:null_index]
-    obj_type, size_str = header.decode().split()
+    obj_type, size_str = full_data[:null_index].decode().split()
     size = int(size_str)
-    data = full_data[null_index+1:]
+    data = memoryview(full_data)[null_index+1:]
     assert size == len(data), 'expected size {}, got {} bytes'.format(
         size, len(data)
     )
+    if not view:
+        data = full_data[null_index+1:]
     return (obj_type, data)
 
 def cat_file(mode, sha1_prefix):
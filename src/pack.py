@@ -0,0 +1,317 @@
+"""
+reads and writes pack files (and their .idx) under .pygit/objects/pack
+"""
+
+import bisect
+import enum
+import functools
+import hashlib
+import os
+import struct
+import zlib
+
+from . import read_file, write_file
+from .compression import compress
+
+PACK_DIR = os.path.join('.pygit', 'objects', 'pack')
+IDX_SIGNATURE = b'\xfftOc'
+
+class ObjectType(enum.Enum):
+    """
+    Object type enumerator
+    """
+
+    commit = 1
+    tree = 2
+    blob = 3
+
+def encode_pack_data(obj_type, data, operation='pack'):
+    """
+    encode object data for a pack
+
+    return bytes of variable-length type and size header followed by the
+    compressed data
+
+    :param obj_type: type of the object [blob/commit/tree]
+    :type obj_type: string
+    :param data: data of the object
+    :type data: bytes-like object
+    :param operation: compression operation, defaults to 'pack'
+    :param operation: string, optional
+    :return: encoded object
+    :rtype: bytes
+    """
+
+    type_num = ObjectType[obj_type].value
+    size = len(data)
+    byte = (type_num << 4) | (size & 0x0f)
+    size >>= 4
+    header = []
+    while size:
+        header.append(byte | 0x80)
+        byte = size & 0x7f
+        size >>= 7
+    header.append(byte)
+    return bytes(header) + compress(data, operation)
+
+class PackWriter:
+    """
+    Streaming pack file writer
+
+    objects are appended to a temporary pack as they come, skipping ones
+    already written; close() fixes up the object count, writes the SHA-1
+    trailer and the .idx, and moves both in place.
+    """
+
+    def __init__(self, operation='pack'):
+        os.makedirs(PACK_DIR, exist_ok=True)
+        self.operation = operation
+        self.path = os.path.join(PACK_DIR, 'tmp_pack_{}'.format(os.getpid()))
+        self.fh = open(self.path, 'wb+')
+        self.fh.write(struct.pack('!4sLL', b'PACK', 2, 0))
+        self.offset = 12
+        # SHA-1 (bytes) -> (offset, crc32, stored size) of every object in the pack
+        self.objects = {}
+
+    def __contains__(self, sha1):
+        return bytes.fromhex(sha1) in self.objects
+
+    def read(self, sha1):
+        """
+        read back an object added to the pack
+
+        :param sha1: SHA-1 hash of the object
+        :type sha1: hex string
+        :return: object type and data inside the object
+        :rtype: tuple
+        """
+
+        offset, _, stored_size = self.objects[bytes.fromhex(sha1)]
+        self.fh.seek(offset)
+        stored = self.fh.read(stored_size)
+        self.fh.seek(self.offset)
+        return decode_pack_data(stored)
+
+    def add(self, data, obj_type):
+        """
+        add object to the pack
+
+        :param data: data of the object
+        :type data: bytes-like object
+        :param obj_type: type of the object [blob/commit/tree]
+        :type obj_type: string
+        :return: SHA-1 object hash
+        :rtype: hex string
+        """
+
+        sha1 = hashlib.sha1('{} {}\x00'.format(obj_type, len(data)).encode())
+        sha1.update(data)
+        digest = sha1.digest()
+        if digest not in self.objects:
+            encoded = encode_pack_data(obj_type, data, self.operation)
+            self.fh.write(encoded)
+            self.objects[digest] = (self.offset, zlib.crc32(encoded), len(encoded))
+            self.offset += len(encoded)
+        return sha1.hexdigest()
+
+    def abort(self):
+        """
+        discard the pack, removing the temporary file
+        """
+
+        self.fh.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def close(self):
+        """
+        finish the pack
+
+        :return: path of the pack file, None if no objects were added
+        :rtype: string
+        """
+
+        if not self.objects:
+            self.abort()
+            return None
+        self.fh.seek(0)
+        self.fh.write(struct.pack('!4sLL', b'PACK', 2, len(self.objects)))
+        self.fh.seek(0)
+        sha1 = hashlib.sha1()
+        for chunk in iter(functools.partial(self.fh.read, 1 << 20), b''):
+            sha1.update(chunk)
+        pack_sha1 = sha1.digest()
+        self.fh.write(pack_sha1)
+        self.fh.close()
+        path = os.path.join(PACK_DIR, 'pack-{}.pack'.format(pack_sha1.hex()))
+        write_pack_index(path[:-5] + '.idx', self.objects, pack_sha1)
+        os.replace(self.path, path)
+        return path
+
+def write_pack_index(path, objects, pack_sha1):
+    """
+    write version 2 .idx file of a pack
+
+    :param path: path of the .idx file
+    :type path: string
+    :param objects: SHA-1 digest -> (offset, crc32, ...) of objects in the pack
+    :type objects: dict
+    :param pack_sha1: SHA-1 trailer of the pack
+    :type pack_sha1: bytes
+    """
+
+    digests = sorted(objects)
+    fanout = [0] * 256
+    for digest in digests:
+        fanout[digest[0]] += 1
+    for i in range(1, 256):
+        fanout[i] += fanout[i-1]
+    offsets = []
+    large_offsets = []
+    for digest in digests:
+        offset = objects[digest][0]
+        if offset < 0x80000000:
+            offsets.append(offset)
+        else:
+            offsets.append(0x80000000 | len(large_offsets))
+            large_offsets.append(offset)
+    data = b''.join([
+        IDX_SIGNATURE, struct.pack('!L', 2),
+        struct.pack('!256L', *fanout),
+        b''.join(digests),
+        struct.pack('!{}L'.format(len(digests)), *(objects[d][1] for d in digests)),
+        struct.pack('!{}L'.format(len(offsets)), *offsets),
+        struct.pack('!{}Q'.format(len(large_offsets)), *large_offsets),
+        pack_sha1,
+    ])
+    write_file(path, data + hashlib.sha1(data).digest())
+
+@functools.lru_cache(maxsize=None)
+def read_pack_index(path):
+    """
+    read version 2 .idx file of a pack
+
+    :param path: path of the .idx file
+    :type path: string
+    :return: sorted SHA-1 digests, the matching pack offsets and stored sizes
+    :rtype: tuple
+    """
+
+    data = read_file(path)
+    signature, version = struct.unpack_from('!4sL', data)
+    assert signature == IDX_SIGNATURE and version == 2, 'unsupported pack index {}'.format(path)
+    count = struct.unpack_from('!L', data, 8 + 255*4)[0]
+    digests_start = 8 + 256*4
+    offsets_start = digests_start + count*24
+    large_start = offsets_start + count*4
+    view = memoryview(data)
+    digests = [bytes(view[i:i+20]) for i in range(digests_start, digests_start + count*20, 20)]
+    offsets = list(struct.unpack_from('!{}L'.format(count), data, offsets_start))
+    for i, offset in enumerate(offsets):
+        if offset & 0x80000000:
+            offsets[i] = struct.unpack_from('!Q', data, large_start + (offset & 0x7fffffff)*8)[0]
+    pack_end = os.path.getsize(path[:-4] + '.pack') - 20
+    ends = sorted(offsets)[1:] + [pack_end]
+    next_offsets = dict(zip(sorted(offsets), ends))
+    sizes = [next_offsets[offset] - offset for offset in offsets]
+    return (digests, offsets, sizes)
+
+def list_packs():
+    """
+    list pack files of the repository
+
+    :return: paths of the pack files
+    :rtype: list
+    """
+
+    if not os.path.isdir(PACK_DIR):
+        return []
+    return sorted(os.path.join(PACK_DIR, name) for name in os.listdir(PACK_DIR)
+        if name.startswith('pack-') and name.endswith('.pack'))
+
+def find_packed_object(sha1_prefix):
+    """
+    find packed object by hash prefix
+
+    Find object with given SHA-1 prefix in the pack files and return tuple of
+    pack path, offset and stored size of the object, or None if it is not
+    packed.
+    Raises ValueError when the prefix matches several objects.
+
+    :param sha1_prefix: SHA-1 prefix of the object
+    :type sha1_prefix: HexString
+    :return: pack path, offset and stored size
+    :rtype: tuple
+    """
+
+    low = bytes.fromhex(sha1_prefix + '0' * (len(sha1_prefix) & 1))
+    found = []
+    for pack_path in list_packs():
+        digests, offsets, sizes = read_pack_index(pack_path[:-5] + '.idx')
+        i = bisect.bisect_left(digests, low)
+        while i < len(digests) and digests[i].hex().startswith(sha1_prefix):
+            found.append((digests[i], pack_path, offsets[i], sizes[i]))
+            i += 1
+    if len({found_object[0] for found_object in found}) >= 2:
+        raise ValueError('multiple objects with the hash prefix {!r} found!'.format(sha1_prefix))
+    if not found:
+        return None
+    return found[0][1:]
+
+def read_packed_object(pack_path, offset, stored_size):
+    """
+    read object from a pack
+
+    Read the (non-delta) object at offset in the pack file and return tuple
+    of object type and data in the object
+
+    :param pack_path: path of the pack file
+    :type pack_path: string
+    :param offset: offset of the object in the pack
+    :type offset: int
+    :param stored_size: bytes taken by the object in the pack
+    :type stored_size: int
+    :return: object type and data inside the object
+    :rtype: tuple
+    """
+
+    with open(pack_path, 'rb') as fh:
+        fh.seek(offset)
+        return decode_pack_data(fh.read(stored_size))
+
+def decode_pack_header(stored):
+    """
+    decode the type and size header of an object stored in a pack
+
+    :param stored: start of the stored object
+    :type stored: bytes
+    :return: object type, inflated size and length of the header
+    :rtype: tuple
+    """
+
+    byte = stored[0]
+    type_num = (byte >> 4) & 7
+    size = byte & 0x0f
+    shift = 4
+    i = 1
+    while byte & 0x80:
+        byte = stored[i]
+        size |= (byte & 0x7f) << shift
+        shift += 7
+        i += 1
+    return (ObjectType(type_num).name, size, i)
+
+def decode_pack_data(stored):
+    """
+    decode a (non-delta) object stored in a pack
+
+    :param stored: header and compressed data of the object
+    :type stored: bytes
+    :return: object type and data inside the object
+    :rtype: tuple
+    """
+
+    obj_type, size, i = decode_pack_header(stored)
+    data = zlib.decompress(memoryview(stored)[i:])
+    assert size == len(data), 'expected size {}, got {} bytes'.format(size, len(data))
+    return (obj_type, data)
@@ -2,26 +2,23 @@
 contain all methods related to push operation
 """
 
+import collections
+import concurrent.futures
 import os
-from .objects import read_object
+from .objects import object_size, read_object
 from .conn_handler import get_remote_master_branch, build_lines_data, http_request, extract_lines
 from .comp import find_missing_objects
 from .commit import get_local_master_hash
-import enum
-import zlib
+from .compression import print_stats
+from .pack import encode_pack_data
 import struct
 import hashlib
 
-class ObjectType(enum.Enum):
-    """
-    Object type enumerator
-    """
+# Inflated bytes of objects being encoded at once by iter_pack (each task
+# holds the inflated object and its recompressed output)
+PACK_INFLIGHT_BUDGET = 64 * 1024 * 1024
 
-    commit = 1
-    tree = 2
-    blob = 3
-
-def encode_pack_object(obj):
+def encode_pack_object(obj, operation='pack'):
     """
     encode a single object
     
@@ -30,24 +27,64 @@ def encode_pack_object(obj):
     
     :param obj: object to be encoded
     :type obj: ObjType
+    :param operation: compression operation (pack or repack), defaults to 'pack'
+    :param operation: string, optional
     :return: encoded object
     :rtype: bytes
     """
 
-    obj_type, data = read_object(obj)
-    type_num = ObjectType[obj_type].value
-    size = len(data)
-    byte = (type_num << 4) | (size & 0x0f)
-    size >>= 4
-    header = []
-    while size:
-        header.append(byte | 0x80)
-        byte = size & 0x7f
-        size >>= 7
-    header.append(byte)
-    return bytes(header) + zlib.compress(data)
+    obj_type, data = read_object(obj, view=True)
+    return encode_pack_data(obj_type, data, operation)
+
+def iter_pack(objects, threads=1, budget=PACK_INFLIGHT_BUDGET):
+    """
+    generate pack data from objects
+    
+    generate the chunks of a pack file containing all objects in given set of
+    SHA-1 hashes, in sorted order, followed by the SHA-1 trailer. With more
+    than one thread objects are read and compressed concurrently by a worker
+    pool (zlib releases the GIL), while keeping no more than "budget" inflated
+    bytes of objects in flight.
+    
+    :param objects: objects to be packed
+    :type objects: set
+    :param threads: number of encoding threads, defaults to 1
+    :param threads: int, optional
+    :param budget: in-flight inflated bytes allowed, defaults to PACK_INFLIGHT_BUDGET
+    :param budget: int, optional
+    :return: pack file chunks
+    :rtype: generator of bytes
+    """
+
+    header = struct.pack('!4sLL', b'PACK', 2, len(objects))
+    sha1 = hashlib.sha1(header)
+    yield header
+    if threads <= 1:
+        for obj in sorted(objects):
+            encoded = encode_pack_object(obj)
+            sha1.update(encoded)
+            yield encoded
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+            pending = collections.deque()
+            in_flight = 0
+            for obj in sorted(objects):
+                cost = object_size(obj)
+                while pending and in_flight + cost > budget:
+                    future, done_cost = pending.popleft()
+                    in_flight -= done_cost
+                    encoded = future.result()
+                    sha1.update(encoded)
+                    yield encoded
+                pending.append((executor.submit(encode_pack_object, obj), cost))
+                in_flight += cost
+            for future, _ in pending:
+                encoded = future.result()
+                sha1.update(encoded)
+                yield encoded
+    yield sha1.digest()
 
-def create_pack(objects):
+def create_pack(objects, threads=1):
     """
     create pack from objects
     
@@ -55,18 +92,16 @@ def create_pack(objects):
     SHA-1 hashes, return data bytes of full pack file
     
     :param objects: objects to be packed
-    :type objects: ObjectType
+    :type objects: set
+    :param threads: number of encoding threads, defaults to 1
+    :param threads: int, optional
     :return: pack of objects
-    :rtype: SHA-1 string
+    :rtype: bytes
     """
-    header = struct.pack('!4sLL', b'PACK', 2, len(objects))
-    body = b''.join(encode_pack_object(o) for o in sorted(objects))
-    contents = header + body
-    sha1 = hashlib.sha1(contents).digest()
-    data = contents + sha1
-    return data
 
-def push(git_url, username=None, password=None):
+    return b''.join(iter_pack(objects, threads))
+
+def push(git_url, username=None, password=None, threads=1):
     """
     push master branch to given git repo URL
     
@@ -76,6 +111,8 @@ def push(git_url, username=None, password=None):
     :param username: string, optional
     :param password: git password, defaults to None
     :param password: string, optional
+    :param threads: number of pack encoding threads, defaults to 1
+    :param threads: int, optional
     :return: remote sha-1 commit string and missing objects
     :rtype: tuple
     """
@@ -94,7 +131,8 @@ def push(git_url, username=None, password=None):
     lines = ['{} {} refs/heads/master\x00 report-status'.format(
             remote_sha1 or ('0'*40), local_sha1
         ).encode()]
-    data = build_lines_data(lines)+create_pack(missing)
+    data = b''.join(build_lines_data(lines)) + create_pack(missing, threads)
+    print_stats()
     url = git_url + '/git-receive-pack'
     response = http_request(url, username, password, data=data)
     lines = extract_lines(response)
@@ -0,0 +1,133 @@
+"""
+implements repack subcommand to pack all reachable objects (with bitmaps)
+"""
+
+import os
+import stat
+
+from .bitmap import pack_order, write_bitmap_index
+from .commit import list_refs
+from .comp import find_reachable_bitmap, read_tree
+from .compression import print_stats
+from .objects import read_object
+from .pack import PackWriter, list_packs, read_pack_index
+
+# Besides branch heads, every this many-th commit gets a bitmap
+BITMAP_COMMIT_INTERVAL = 100
+
+def walk_objects(ref_sha1s):
+    """
+    generate objects reachable from commits
+
+    walk history from the given commits and yield every reachable object
+    once, each commit followed by the tree objects it introduces
+
+    :param ref_sha1s: SHA-1 hashes of the commits to start from
+    :type ref_sha1s: list
+    :return: (SHA-1, type, data) of every object, commits newest first
+    :rtype: generator of tuples
+    """
+
+    seen = set()
+
+    def walk_tree(tree_sha1):
+        if tree_sha1 in seen:
+            return
+        seen.add(tree_sha1)
+        obj_type, data = read_object(tree_sha1)
+        yield (tree_sha1, obj_type, data)
+        for mode, path, sha1 in read_tree(data=data):
+            if stat.S_ISDIR(mode):
+                yield from walk_tree(sha1)
+            elif sha1 not in seen:
+                seen.add(sha1)
+                yield (sha1,) + read_object(sha1, view=True)
+
+    stack = list(reversed(ref_sha1s))
+    while stack:
+        sha1 = stack.pop()
+        if sha1 in seen:
+            continue
+        seen.add(sha1)
+        obj_type, commit = read_object(sha1)
+        assert obj_type == 'commit', 'object {} is not commit'.format(obj_type)
+        yield (sha1, obj_type, commit)
+        lines = commit.decode().splitlines()
+        yield from walk_tree(next(l[5:45] for l in lines if l.startswith('tree ')))
+        stack.extend(reversed([l[7:47] for l in lines if l.startswith('parent ')]))
+
+def repack(write_bitmap=False, delete=False):
+    """
+    repack the repository
+
+    write all objects reachable from the branch heads to a single new pack,
+    compressed with the repack level. With "write_bitmap" also write a
+    .bitmap with the reachable objects of every branch head and every
+    BITMAP_COMMIT_INTERVAL-th commit, which push uses to count objects.
+    With "delete" the old packs and the loose objects now packed are removed;
+    unreachable objects that were only in the old packs are lost, and how
+    many is printed.
+
+    :param write_bitmap: write a bitmap index, defaults to False
+    :param write_bitmap: bool, optional
+    :param delete: remove redundant packs and loose objects, defaults to False
+    :param delete: bool, optional
+    :return: path of the new pack, None if there is nothing to pack
+    :rtype: string
+    """
+
+    old_packs = list_packs()
+    heads = sorted(set(list_refs().values()))
+    commits = []
+    objects = []
+    pack = PackWriter('repack')
+    for sha1, obj_type, data in walk_objects(heads):
+        if obj_type == 'commit':
+            commits.append(sha1)
+        objects.append(sha1)
+        pack.add(data, obj_type)
+    pack_path = pack.close()
+    if pack_path is None:
+        print('nothing to repack')
+        return None
+
+    bitmaps = 0
+    if write_bitmap:
+        index = pack_order(pack_path)
+        selected = set(heads) | set(commits[::BITMAP_COMMIT_INTERVAL])
+        for sha1 in reversed(commits):
+            if sha1 in selected:
+                index.commits[sha1] = bytes(find_reachable_bitmap(sha1, index)[0])
+        write_bitmap_index(index)
+        bitmaps = len(index.commits)
+
+    dropped = 0
+    if delete:
+        lost = set()
+        for old_pack in old_packs:
+            if old_pack == pack_path:
+                continue
+            digests, _, _ = read_pack_index(old_pack[:-5] + '.idx')
+            lost.update(digest.hex() for digest in digests)
+            for ext in ('.pack', '.idx', '.bitmap'):
+                if os.path.exists(old_pack[:-5] + ext):
+                    os.remove(old_pack[:-5] + ext)
+        for sha1 in objects:
+            path = os.path.join('.pygit', 'objects', sha1[:2], sha1[2:])
+            if os.path.exists(path):
+                os.remove(path)
+                if not os.listdir(os.path.dirname(path)):
+                    os.rmdir(os.path.dirname(path))
+        dropped = sum(1 for sha1 in lost.difference(objects)
+            if not os.path.exists(os.path.join('.pygit', 'objects', sha1[:2], sha1[2:])))
+    print('packed {} object{} from {} commit{} into {} ({} bitmap{})'.format(
+        len(objects), '' if len(objects) == 1 else 's',
+        len(commits), '' if len(commits) == 1 else 's',
+        os.path.basename(pack_path), bitmaps, '' if bitmaps == 1 else 's'
+    ))
+    if dropped:
+        print('dropped {} unreachable object{} from the old packs'.format(
+            dropped, '' if dropped == 1 else 's'
+        ))
+    print_stats()
+    return pack_path